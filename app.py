@@ -1,5 +1,8 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, g, Response, stream_with_context
+from flask_caching import Cache
 from datetime import datetime, timedelta
+import json
+import os
 import config
 from database.db_manager import DatabaseManager
 from ml_module.predictor import MissedDosePredictor
@@ -9,6 +12,13 @@ from ml_module.analyzer import BehaviorAnalyzer
 app = Flask(__name__)
 app.config['SECRET_KEY'] = config.SECRET_KEY
 
+# Response cache for read-only API routes
+cache = Cache(app, config={
+    'CACHE_TYPE': config.CACHE_TYPE,
+    'CACHE_DIR': config.CACHE_DIR,
+    'CACHE_DEFAULT_TIMEOUT': config.CACHE_DEFAULT_TIMEOUT
+})
+
 # Initialize database
 db = DatabaseManager()
 
@@ -16,6 +26,18 @@ db = DatabaseManager()
 predictor = MissedDosePredictor(db)
 analyzer = BehaviorAnalyzer(db)
 
+def invalidate_cache():
+    """Drop cached API responses after data changes"""
+    # Every cached route reads medications or dose history, so clear them all
+    cache.clear()
+
+@app.before_request
+def set_request_dates():
+    """Format the date strings used by this request once"""
+    now = datetime.now()
+    g.today_str = now.strftime('%Y-%m-%d')
+    g.week_start_str = (now - timedelta(days=7)).strftime('%Y-%m-%d')
+
 # ============================================
 # ROUTES - Web Pages
 # ============================================
@@ -55,6 +77,7 @@ def ai_insights_page():
 # ============================================
 
 @app.route('/api/medications', methods=['GET'])
+@cache.cached(timeout=60, key_prefix='meds_all')
 def get_medications():
     """Get all medications"""
     medications = db.get_all_medications()
@@ -73,7 +96,7 @@ def get_medication(medication_id):
 @app.route('/api/medications', methods=['POST'])
 def add_medication():
     """Add new medication"""
-    data = request.json
+    data = request.get_json(silent=True) or {}
     
     name = data.get('name')
     dosage = data.get('dosage')
@@ -83,6 +106,7 @@ def add_medication():
         return jsonify({'success': False, 'message': 'Missing required fields'})
     
     med_id = db.add_medication(name, dosage, schedules)
+    invalidate_cache()
     
     return jsonify({
         'success': True, 
@@ -93,7 +117,7 @@ def add_medication():
 @app.route('/api/medications/<int:medication_id>', methods=['PUT'])
 def update_medication(medication_id):
     """Update existing medication"""
-    data = request.json
+    data = request.get_json(silent=True) or {}
     
     name = data.get('name')
     dosage = data.get('dosage')
@@ -108,6 +132,7 @@ def update_medication(medication_id):
         return jsonify({'success': False, 'message': 'Medication not found'}), 404
     
     success = db.update_medication(medication_id, name, dosage, schedules)
+    invalidate_cache()
     
     if success:
         return jsonify({'success': True, 'message': 'Medication updated successfully'})
@@ -123,6 +148,7 @@ def delete_medication(medication_id):
         return jsonify({'success': False, 'message': 'Medication not found'}), 404
     
     success = db.delete_medication(medication_id)
+    invalidate_cache()
     
     if success:
         return jsonify({'success': True, 'message': 'Medication deleted successfully'})
@@ -132,37 +158,52 @@ def delete_medication(medication_id):
 @app.route('/api/record-dose', methods=['POST'])
 def record_dose():
     """Record a dose as taken/missed/delayed"""
-    data = request.json
+    data = request.get_json(silent=True) or {}
     
     medication_id = data.get('medication_id')
     scheduled_time = data.get('scheduled_time')
     actual_time = data.get('actual_time')
     status = data.get('status')  # 'taken', 'missed', 'delayed'
     
-    if not all([medication_id, scheduled_time, status]):
+    # Explicit None check so a medication_id of 0 is not treated as missing
+    if medication_id is None or not scheduled_time or not status:
         return jsonify({'success': False, 'message': 'Missing required fields'})
     
-    db.record_dose(medication_id, scheduled_time, actual_time, status)
+    if not db.record_dose(medication_id, scheduled_time, actual_time, status):
+        return jsonify({'success': False, 'message': 'Medication not found'}), 404
+    invalidate_cache()
     
     return jsonify({'success': True, 'message': 'Dose recorded successfully'})
 
 @app.route('/api/todays-schedule', methods=['GET'])
+@cache.cached(timeout=30)
 def get_todays_schedule():
     """Get today's medication schedule"""
-    schedule = db.get_todays_schedule()
+    schedule = db.get_todays_schedule(today=g.today_str)
     return jsonify({'success': True, 'data': schedule})
 
 @app.route('/api/dose-history', methods=['GET'])
 def get_dose_history():
     """Get dose history"""
     days = request.args.get('days', 30, type=int)
-    history = db.get_dose_history(days=days)
-    return jsonify({'success': True, 'data': history})
+    history = db.iter_dose_history(days=days)
+    
+    # Stream rows as SQLite reads them instead of building the whole list
+    def generate():
+        yield '{"success": true, "data": ['
+        separator = ''
+        for row in history:
+            yield separator + json.dumps(row)
+            separator = ','
+        yield ']}'
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
 
 @app.route('/api/statistics', methods=['GET'])
+@cache.cached(timeout=60)
 def get_statistics():
     """Get overall statistics"""
-    stats = db.get_statistics()
+    stats = db.get_statistics(week_start=g.week_start_str)
     return jsonify({'success': True, 'data': stats})
 
 # ============================================
@@ -170,6 +211,7 @@ def get_statistics():
 # ============================================
 
 @app.route('/api/ai/predictions', methods=['GET'])
+@cache.cached(timeout=120)
 def get_predictions():
     """Get AI predictions for today"""
     predictions = predictor.get_predictions_for_today()
@@ -178,7 +220,7 @@ def get_predictions():
 @app.route('/api/ai/predict-dose', methods=['POST'])
 def predict_single_dose():
     """Predict probability for a specific dose"""
-    data = request.json
+    data = request.get_json(silent=True) or {}
     
     medication_id = data.get('medication_id')
     scheduled_time = data.get('scheduled_time')
@@ -186,11 +228,13 @@ def predict_single_dose():
     if not medication_id or not scheduled_time:
         return jsonify({'success': False, 'message': 'Missing required fields'})
     
+    predictor.ensure_model()
     prediction = predictor.predict_miss_probability(medication_id, scheduled_time)
     
     return jsonify({'success': True, 'data': prediction})
 
 @app.route('/api/ai/analyze-adherence', methods=['GET'])
+@cache.cached(query_string=True)
 def analyze_adherence():
     """Get adherence analysis"""
     days = request.args.get('days', 30, type=int)
@@ -205,6 +249,7 @@ def detect_patterns():
     return jsonify({'success': True, 'data': patterns})
 
 @app.route('/api/ai/insights', methods=['GET'])
+@cache.cached(timeout=120)
 def get_insights():
     """Get overall AI insights"""
     insights = analyzer.generate_insights()
@@ -214,6 +259,7 @@ def get_insights():
 def train_model():
     """Manually trigger model training"""
     success = predictor.train_model()
+    invalidate_cache()
     
     if success:
         return jsonify({'success': True, 'message': 'Model trained successfully'})
@@ -242,6 +288,14 @@ if __name__ == '__main__':
     print("=" * 60)
     print("Starting server...")
     print(f"Dashboard: http://localhost:5000")
+    print("For production use:")
+    print("  gunicorn -w 1 -k gthread --threads 8 -b 0.0.0.0:5000 app:app")
+    print("  or set PROD=1 to serve with waitress")
     print("=" * 60)
     
-    app.run(debug=config.DEBUG_MODE, host='0.0.0.0', port=5000)
\ No newline at end of file
+    if os.environ.get('PROD'):
+        # Multi-threaded production server, also works on Windows
+        from waitress import serve
+        serve(app, host='0.0.0.0', port=5000, threads=8)
+    else:
+        app.run(debug=config.DEBUG_MODE, host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
@@ -11,6 +11,8 @@ DATABASE_PATH = os.path.join(BASE_DIR, 'database', 'medication_tracker.db')
 
 # ML Model configuration
 MODEL_PATH = os.path.join(BASE_DIR, 'ml_module', 'missed_dose_model.pkl')
+INFERENCE_PARAMS_PATH = os.path.join(BASE_DIR, 'ml_module', 'inference_params.npz')
+PREDICTION_CACHE_PATH = os.path.join(BASE_DIR, 'ml_module', 'prediction_cache.pkl')
 TRAINING_DATA_MIN_RECORDS = 10  # Minimum records needed to train ML model
 
 # Reminder settings
@@ -25,6 +27,14 @@ DELAY_TOLERANCE = 60
 # AI prediction thresholds
 MISS_PROBABILITY_THRESHOLD = 0.6  # Above 60% = high risk of missing dose
 
+# Response caching (Flask-Caching)
+# SimpleCache lives in one process, so invalidation only reaches the worker
+# that handled a write. Set CACHE_TYPE=FileSystemCache when running more
+# than one worker process so they share one cache in CACHE_DIR
+CACHE_TYPE = os.environ.get('CACHE_TYPE', 'SimpleCache')
+CACHE_DIR = os.environ.get('CACHE_DIR', os.path.join(BASE_DIR, 'cache'))
+CACHE_DEFAULT_TIMEOUT = 30  # Seconds before a cached API response expires
+
 # Application settings
 SECRET_KEY = 'your-secret-key-change-in-production'
 DEBUG_MODE = True
\ No newline at end of file
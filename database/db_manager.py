@@ -2,20 +2,185 @@
 # Database manager for medication tracking system
 
 import sqlite3
+import threading
 from datetime import datetime, timedelta
 import config
 
+# SQL statements live at module level so every call passes the identical
+# string and hits the connection's prepared-statement cache
+STATEMENT_CACHE_SIZE = 256
+
+CONNECTION_PRAGMAS = (
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-20000',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA foreign_keys=ON',
+)
+
+# Schema
+SQL_CREATE_MEDICATIONS = '''
+    CREATE TABLE IF NOT EXISTS medications (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        dosage TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+# Schedules table (multiple times per day allowed)
+SQL_CREATE_SCHEDULES = '''
+    CREATE TABLE IF NOT EXISTS schedules (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        medication_id INTEGER NOT NULL,
+        scheduled_time TEXT NOT NULL,
+        FOREIGN KEY (medication_id) REFERENCES medications (id) ON DELETE CASCADE
+    )
+'''
+
+# Dose history table (tracks taken, missed, delayed)
+SQL_CREATE_DOSE_HISTORY = '''
+    CREATE TABLE IF NOT EXISTS dose_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        medication_id INTEGER NOT NULL,
+        scheduled_time TIMESTAMP NOT NULL,
+        actual_time TIMESTAMP,
+        status TEXT NOT NULL,
+        delay_minutes INTEGER DEFAULT 0,
+        recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (medication_id) REFERENCES medications (id) ON DELETE CASCADE
+    )
+'''
+
+SQL_CREATE_INDEXES = (
+    # Joining schedules onto medications
+    'CREATE INDEX IF NOT EXISTS idx_schedules_med ON schedules(medication_id)',
+    # Dose history date-range scans; (scheduled_time, status) covers the
+    # statistics GROUP BY without touching the table
+    'CREATE INDEX IF NOT EXISTS idx_dh_sched ON dose_history(scheduled_time)',
+    'CREATE INDEX IF NOT EXISTS idx_dh_med_sched ON dose_history(medication_id, scheduled_time)',
+    'CREATE INDEX IF NOT EXISTS idx_dh_sched_status ON dose_history(scheduled_time, status)',
+)
+
+# Medications and schedules
+SQL_INSERT_MED = 'INSERT INTO medications (name, dosage) VALUES (?, ?)'
+SQL_UPDATE_MED = 'UPDATE medications SET name = ?, dosage = ? WHERE id = ?'
+SQL_DELETE_MED = 'DELETE FROM medications WHERE id = ?'
+SQL_INSERT_SCHED = 'INSERT INTO schedules (medication_id, scheduled_time) VALUES (?, ?)'
+SQL_DELETE_SCHEDS = 'DELETE FROM schedules WHERE medication_id = ?'
+
+SQL_SELECT_MED_BY_ID = '''
+    SELECT m.id, m.name, m.dosage, m.created_at, s.scheduled_time
+    FROM medications m
+    LEFT JOIN schedules s ON s.medication_id = m.id
+    WHERE m.id = ?
+    ORDER BY s.id
+'''
+
+SQL_SELECT_ALL_MEDS = '''
+    SELECT m.id, m.name, m.dosage, m.created_at, s.scheduled_time
+    FROM medications m
+    LEFT JOIN schedules s ON s.medication_id = m.id
+    ORDER BY m.id, s.id
+'''
+
+SQL_SELECT_SCHEDULES = '''
+    SELECT m.id, m.name, m.dosage, s.scheduled_time
+    FROM medications m
+    JOIN schedules s ON m.id = s.medication_id
+'''
+
+# Dose history
+SQL_INSERT_DOSE = '''
+    INSERT INTO dose_history
+    (medication_id, scheduled_time, actual_time, status, delay_minutes)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+SQL_SELECT_DOSE_HISTORY = '''
+    SELECT dh.*, m.name, m.dosage
+    FROM dose_history dh
+    JOIN medications m ON dh.medication_id = m.id
+    WHERE dh.scheduled_time >= ?
+    ORDER BY dh.scheduled_time DESC
+'''
+
+SQL_SELECT_RECENT_STATUS = '''
+    SELECT status, delay_minutes
+    FROM dose_history
+    WHERE medication_id = ? AND scheduled_time >= ?
+    ORDER BY scheduled_time DESC
+    LIMIT ?
+'''
+
+SQL_COUNT_BY_STATUS = '''
+    SELECT status, COUNT(*) as count
+    FROM dose_history
+    WHERE scheduled_time >= ?
+    GROUP BY status
+'''
+
+SQL_COUNT_BY_STATUS_DUAL = '''
+    SELECT CASE WHEN scheduled_time >= ? THEN 'recent' ELSE 'old' END AS period,
+           status, COUNT(*) as count
+    FROM dose_history
+    WHERE scheduled_time >= ?
+    GROUP BY period, status
+'''
+
+# One scan grouped by (weekday, hour, status); the result is at most
+# 7 * 24 * 3 rows however long the history is
+_SQL_MISS_BUCKETS = '''
+    SELECT CAST(strftime('%w', scheduled_time) AS INTEGER) AS dow,
+           CAST(strftime('%H', scheduled_time) AS INTEGER) AS hour,
+           status,
+           COUNT(*) AS count,
+           SUM(delay_minutes) AS total_delay,
+           MAX(scheduled_time) AS latest
+    FROM dose_history
+    WHERE {where}
+    GROUP BY dow, hour, status
+'''
+SQL_MISS_BUCKETS = _SQL_MISS_BUCKETS.format(where='scheduled_time >= ?')
+SQL_MISS_BUCKETS_FOR_MED = _SQL_MISS_BUCKETS.format(
+    where='scheduled_time >= ? AND medication_id = ?'
+)
+
+# Count everything in one statement; COALESCE covers an empty week
+SQL_WEEKLY_STATISTICS = '''
+    SELECT
+        (SELECT COUNT(*) FROM medications) AS total_meds,
+        COALESCE(SUM(CASE WHEN status = 'taken' THEN 1 ELSE 0 END), 0) AS taken,
+        COALESCE(SUM(CASE WHEN status = 'missed' THEN 1 ELSE 0 END), 0) AS missed,
+        COALESCE(SUM(CASE WHEN status = 'delayed' THEN 1 ELSE 0 END), 0) AS delayed
+    FROM dose_history
+    WHERE scheduled_time >= ?
+'''
+
 class DatabaseManager:
     """Manages all database operations for medication tracking"""
     
     def __init__(self):
         self.db_path = config.DATABASE_PATH
+        self._local = threading.local()  # One connection per worker thread
         self.initialize_database()
     
     def get_connection(self):
-        """Create and return database connection"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+        """Return this thread's database connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                check_same_thread=False,
+                cached_statements=STATEMENT_CACHE_SIZE
+            )
+            conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+            
+            # Per-connection tuning, paid once instead of on every call
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            
+            self._local.conn = conn
         return conn
     
     def initialize_database(self):
@@ -23,42 +188,51 @@ class DatabaseManager:
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        # Medications table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS medications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                dosage TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Schedules table (multiple times per day allowed)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS schedules (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                medication_id INTEGER NOT NULL,
-                scheduled_time TEXT NOT NULL,
-                FOREIGN KEY (medication_id) REFERENCES medications (id)
-            )
-        ''')
-        
-        # Dose history table (tracks taken, missed, delayed)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS dose_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                medication_id INTEGER NOT NULL,
-                scheduled_time TIMESTAMP NOT NULL,
-                actual_time TIMESTAMP,
-                status TEXT NOT NULL,
-                delay_minutes INTEGER DEFAULT 0,
-                recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (medication_id) REFERENCES medications (id)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        # WAL lets readers run alongside a writer; the mode is stored in
+        # the database file, so it only needs to be set here
+        cursor.execute('PRAGMA journal_mode=WAL')
+        
+        # IMMEDIATE takes the write lock up front, so workers starting at
+        # the same time wait on the busy timeout instead of failing when
+        # a read lock cannot be upgraded; _create_schema then inspects
+        # the tables under that lock, after any other worker migrated
+        with conn:
+            cursor.execute('BEGIN IMMEDIATE')
+            self._create_schema(cursor)
+    
+    def _create_schema(self, cursor):
+        """Create tables and indexes, migrating older child tables"""
+        # Databases created before deletes cascaded from medications get
+        # their child tables rebuilt: move them aside, recreate, copy back
+        legacy_tables = self._tables_without_cascade(cursor)
+        for table in legacy_tables:
+            cursor.execute(f'ALTER TABLE {table} RENAME TO {table}_legacy')
+        
+        cursor.execute(SQL_CREATE_MEDICATIONS)
+        cursor.execute(SQL_CREATE_SCHEDULES)
+        cursor.execute(SQL_CREATE_DOSE_HISTORY)
+        
+        # Copy rows into the rebuilt tables, dropping orphans that the
+        # enforced foreign key would now reject
+        for table in legacy_tables:
+            cursor.execute(f'''
+                INSERT INTO {table}
+                SELECT * FROM {table}_legacy
+                WHERE medication_id IN (SELECT id FROM medications)
+            ''')
+            cursor.execute(f'DROP TABLE {table}_legacy')
+        
+        for statement in SQL_CREATE_INDEXES:
+            cursor.execute(statement)
+    
+    def _tables_without_cascade(self, cursor):
+        """List child tables whose medication foreign key does not cascade"""
+        legacy_tables = []
+        for table in ('schedules', 'dose_history'):
+            cursor.execute(f'PRAGMA foreign_key_list({table})')
+            if any(fk['on_delete'] != 'CASCADE' for fk in cursor.fetchall()):
+                legacy_tables.append(table)
+        return legacy_tables
     
     def add_medication(self, name, dosage, schedule_times):
         """
@@ -68,22 +242,17 @@ class DatabaseManager:
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        # Insert medication
-        cursor.execute(
-            'INSERT INTO medications (name, dosage) VALUES (?, ?)',
-            (name, dosage)
-        )
-        medication_id = cursor.lastrowid
-        
-        # Insert schedules
-        for time in schedule_times:
-            cursor.execute(
-                'INSERT INTO schedules (medication_id, scheduled_time) VALUES (?, ?)',
-                (medication_id, time)
+        with conn:
+            # Insert medication
+            cursor.execute(SQL_INSERT_MED, (name, dosage))
+            medication_id = cursor.lastrowid
+            
+            # Insert schedules
+            cursor.executemany(
+                SQL_INSERT_SCHED,
+                [(medication_id, time) for time in schedule_times]
             )
         
-        conn.commit()
-        conn.close()
         return medication_id
     
     def get_medication_by_id(self, medication_id):
@@ -91,29 +260,13 @@ class DatabaseManager:
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM medications WHERE id = ?', (medication_id,))
-        med = cursor.fetchone()
+        cursor.execute(SQL_SELECT_MED_BY_ID, (medication_id,))
+        rows = cursor.fetchall()
         
-        if not med:
-            conn.close()
+        if not rows:
             return None
         
-        cursor.execute(
-            'SELECT scheduled_time FROM schedules WHERE medication_id = ?',
-            (medication_id,)
-        )
-        schedules = [row['scheduled_time'] for row in cursor.fetchall()]
-        
-        result = {
-            'id': med['id'],
-            'name': med['name'],
-            'dosage': med['dosage'],
-            'schedules': schedules,
-            'created_at': med['created_at']
-        }
-        
-        conn.close()
-        return result
+        return self._group_schedules(rows)[0]
     
     def update_medication(self, medication_id, name, dosage, schedule_times):
         """
@@ -122,27 +275,19 @@ class DatabaseManager:
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        # Update medication info
-        cursor.execute(
-            'UPDATE medications SET name = ?, dosage = ? WHERE id = ?',
-            (name, dosage, medication_id)
-        )
-        
-        # Delete old schedules
-        cursor.execute(
-            'DELETE FROM schedules WHERE medication_id = ?',
-            (medication_id,)
-        )
-        
-        # Insert new schedules
-        for time in schedule_times:
-            cursor.execute(
-                'INSERT INTO schedules (medication_id, scheduled_time) VALUES (?, ?)',
-                (medication_id, time)
+        with conn:
+            # Update medication info
+            cursor.execute(SQL_UPDATE_MED, (name, dosage, medication_id))
+            
+            # Delete old schedules
+            cursor.execute(SQL_DELETE_SCHEDS, (medication_id,))
+            
+            # Insert new schedules
+            cursor.executemany(
+                SQL_INSERT_SCHED,
+                [(medication_id, time) for time in schedule_times]
             )
         
-        conn.commit()
-        conn.close()
         return True
     
     def delete_medication(self, medication_id):
@@ -152,26 +297,10 @@ class DatabaseManager:
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        # Delete schedules
-        cursor.execute(
-            'DELETE FROM schedules WHERE medication_id = ?',
-            (medication_id,)
-        )
-        
-        # Delete dose history
-        cursor.execute(
-            'DELETE FROM dose_history WHERE medication_id = ?',
-            (medication_id,)
-        )
-        
-        # Delete medication
-        cursor.execute(
-            'DELETE FROM medications WHERE id = ?',
-            (medication_id,)
-        )
-        
-        conn.commit()
-        conn.close()
+        # Schedules and dose history go with it via ON DELETE CASCADE
+        with conn:
+            cursor.execute(SQL_DELETE_MED, (medication_id,))
+        
         return True
     
     def get_all_medications(self):
@@ -179,27 +308,31 @@ class DatabaseManager:
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM medications')
-        medications = cursor.fetchall()
+        # Single JOIN instead of one schedules query per medication
+        cursor.execute(SQL_SELECT_ALL_MEDS)
+        rows = cursor.fetchall()
         
-        result = []
-        for med in medications:
-            cursor.execute(
-                'SELECT scheduled_time FROM schedules WHERE medication_id = ?',
-                (med['id'],)
-            )
-            schedules = [row['scheduled_time'] for row in cursor.fetchall()]
+        return self._group_schedules(rows)
+    
+    def _group_schedules(self, rows):
+        """Group medication/schedule JOIN rows into one dict per medication"""
+        medications = {}
+        for row in rows:
+            med = medications.get(row['id'])
+            if med is None:
+                med = medications[row['id']] = {
+                    'id': row['id'],
+                    'name': row['name'],
+                    'dosage': row['dosage'],
+                    'schedules': [],
+                    'created_at': row['created_at']
+                }
             
-            result.append({
-                'id': med['id'],
-                'name': med['name'],
-                'dosage': med['dosage'],
-                'schedules': schedules,
-                'created_at': med['created_at']
-            })
+            # LEFT JOIN yields NULL for medications without schedules
+            if row['scheduled_time'] is not None:
+                med['schedules'].append(row['scheduled_time'])
         
-        conn.close()
-        return result
+        return list(medications.values())
     
     def record_dose(self, medication_id, scheduled_time, actual_time, status):
         """
@@ -207,6 +340,8 @@ class DatabaseManager:
         status: 'taken', 'missed', 'delayed'
         
         FIXED: Only mark as delayed if explicitly more than DELAY_TOLERANCE
+        Returns False when the medication does not exist (e.g. it was
+        deleted from another tab), which the foreign key rejects
         """
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -216,8 +351,10 @@ class DatabaseManager:
         
         if status == 'taken' and actual_time:
             try:
-                scheduled_dt = datetime.strptime(scheduled_time, '%Y-%m-%d %H:%M')
-                actual_dt = datetime.strptime(actual_time, '%Y-%m-%d %H:%M')
+                # Times are 'YYYY-MM-DD HH:MM'; fromisoformat parses that
+                # much faster than strptime
+                scheduled_dt = datetime.fromisoformat(scheduled_time)
+                actual_dt = datetime.fromisoformat(actual_time)
                 delay_minutes = int((actual_dt - scheduled_dt).total_seconds() / 60)
                 
                 # FIXED: Only change to delayed if SIGNIFICANTLY late
@@ -233,100 +370,189 @@ class DatabaseManager:
                 # If error in calculation, keep original status
                 pass
         
-        cursor.execute('''
-            INSERT INTO dose_history 
-            (medication_id, scheduled_time, actual_time, status, delay_minutes)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (medication_id, scheduled_time, actual_time, status, delay_minutes))
+        try:
+            with conn:
+                cursor.execute(
+                    SQL_INSERT_DOSE,
+                    (medication_id, scheduled_time, actual_time, status, delay_minutes)
+                )
+        except sqlite3.IntegrityError:
+            return False
         
-        conn.commit()
-        conn.close()
+        return True
     
     def get_dose_history(self, days=30):
-        """Get dose history for last N days"""
+        """Get dose history for last N days, newest scheduled_time first"""
+        return list(self.iter_dose_history(days=days))
+    
+    def iter_dose_history(self, days=30):
+        """
+        Yield dose history rows for last N days without building a list
+        Rows come newest scheduled_time first; the predictor relies on it
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        # Plain tuples zipped into dicts skip the intermediate Row objects
+        cursor.row_factory = None
+        
+        start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        
+        cursor.execute(SQL_SELECT_DOSE_HISTORY, (start_date,))
+        
+        columns = [col[0] for col in cursor.description]
+        for row in cursor:
+            yield dict(zip(columns, row))
+    
+    def get_recent_dose_status(self, medication_id, limit=7, days=14):
+        """
+        Get (status, delay_minutes) of one medication's latest doses,
+        newest first, within last N days
+        Returns plain tuples since callers only count them
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        
+        start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        
+        cursor.execute(SQL_SELECT_RECENT_STATUS, (medication_id, start_date, limit))
+        
+        return cursor.fetchall()
+    
+    def get_adherence_counts(self, days=30):
+        """
+        Count doses per status for last N days
+        Returns: dict like {'taken': 12, 'missed': 3, 'delayed': 2}
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
         
         start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
         
-        cursor.execute('''
-            SELECT dh.*, m.name, m.dosage
-            FROM dose_history dh
-            JOIN medications m ON dh.medication_id = m.id
-            WHERE dh.scheduled_time >= ?
-            ORDER BY dh.scheduled_time DESC
-        ''', (start_date,))
+        cursor.execute(SQL_COUNT_BY_STATUS, (start_date,))
+        
+        return {row['status']: row['count'] for row in cursor.fetchall()}
+    
+    def get_adherence_counts_dual(self, days_recent=7, days_old=30):
+        """
+        Count doses per status for two windows in a single pass
+        Returns: {'recent': {...}, 'old': {...}} where 'recent' covers the
+        last days_recent days and 'old' the rest of the last days_old days
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        now = datetime.now()
+        recent_start = (now - timedelta(days=days_recent)).strftime('%Y-%m-%d')
+        old_start = (now - timedelta(days=days_old)).strftime('%Y-%m-%d')
+        
+        cursor.execute(SQL_COUNT_BY_STATUS_DUAL, (recent_start, old_start))
+        
+        counts = {'recent': {}, 'old': {}}
+        for row in cursor.fetchall():
+            counts[row['period']][row['status']] = row['count']
+        
+        return counts
+    
+    def get_miss_buckets(self, days=30, medication_id=None):
+        """
+        Aggregate missed doses by weekday and hour, plus delay stats and
+        the total dose count, for last N days (optionally for one medication)
+        by_weekday uses SQLite numbering: 0=Sunday, 6=Saturday
+        by_hour is ordered by most recent miss, so ties break the same
+        way as scanning history newest-first
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
         
-        history = cursor.fetchall()
-        conn.close()
+        # Reducing the grouped rows below costs nothing next to the scan
+        if medication_id:
+            cursor.execute(SQL_MISS_BUCKETS_FOR_MED, (start_date, medication_id))
+        else:
+            cursor.execute(SQL_MISS_BUCKETS, (start_date,))
+        
+        by_weekday = {}
+        hour_counts = {}
+        hour_latest = {}
+        delayed_count = 0
+        total_delay = 0
+        total = 0
+        
+        for row in cursor.fetchall():
+            total += row['count']
+            if row['status'] == 'missed':
+                dow, hour = row['dow'], row['hour']
+                by_weekday[dow] = by_weekday.get(dow, 0) + row['count']
+                hour_counts[hour] = hour_counts.get(hour, 0) + row['count']
+                hour_latest[hour] = max(hour_latest.get(hour, ''), row['latest'])
+            elif row['status'] == 'delayed':
+                delayed_count += row['count']
+                total_delay += row['total_delay'] or 0
+        
+        by_hour = {
+            hour: hour_counts[hour]
+            for hour in sorted(hour_counts, key=hour_latest.get, reverse=True)
+        }
         
-        return [dict(row) for row in history]
+        return {
+            'by_weekday': by_weekday,
+            'by_hour': by_hour,
+            'delayed_count': delayed_count,
+            'avg_delay': total_delay / delayed_count if delayed_count else 0,
+            'total': total
+        }
     
-    def get_todays_schedule(self):
-        """Get today's medication schedule"""
+    def get_todays_schedule(self, today=None):
+        """
+        Get today's medication schedule
+        today: optional 'YYYY-MM-DD' string, defaults to the current date
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        today = datetime.now().strftime('%Y-%m-%d')
+        if today is None:
+            today = datetime.now().strftime('%Y-%m-%d')
         
-        cursor.execute('''
-            SELECT m.id, m.name, m.dosage, s.scheduled_time
-            FROM medications m
-            JOIN schedules s ON m.id = s.medication_id
-        ''')
+        cursor.execute(SQL_SELECT_SCHEDULES)
         
         schedules = cursor.fetchall()
-        conn.close()
         
         # Add today's date to scheduled times
+        prefix = today + ' '
         result = []
         for schedule in schedules:
             result.append({
                 'medication_id': schedule['id'],
                 'name': schedule['name'],
                 'dosage': schedule['dosage'],
-                'scheduled_time': f"{today} {schedule['scheduled_time']}"
+                'scheduled_time': prefix + schedule['scheduled_time']
             })
         
         return result
     
-    def get_statistics(self):
-        """Get overall statistics for dashboard"""
+    def get_statistics(self, week_start=None):
+        """
+        Get overall statistics for dashboard
+        week_start: optional 'YYYY-MM-DD' string, defaults to 7 days ago
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        # Total medications
-        cursor.execute('SELECT COUNT(*) as count FROM medications')
-        total_meds = cursor.fetchone()['count']
-        
         # This week's stats
-        week_start = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-        
-        cursor.execute('''
-            SELECT status, COUNT(*) as count
-            FROM dose_history
-            WHERE scheduled_time >= ?
-            GROUP BY status
-        ''', (week_start,))
-        
-        stats = cursor.fetchall()
-        conn.close()
-        
-        # Format stats
-        taken = 0
-        missed = 0
-        delayed = 0
-        
-        for stat in stats:
-            if stat['status'] == 'taken':
-                taken = stat['count']
-            elif stat['status'] == 'missed':
-                missed = stat['count']
-            elif stat['status'] == 'delayed':
-                delayed = stat['count']
+        if week_start is None:
+            week_start = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+        
+        cursor.execute(SQL_WEEKLY_STATISTICS, (week_start,))
+        
+        stats = cursor.fetchone()
+        taken = stats['taken']
+        missed = stats['missed']
+        delayed = stats['delayed']
         
         return {
-            'total_medications': total_meds,
+            'total_medications': stats['total_meds'],
             'taken_this_week': taken,
             'missed_this_week': missed,
             'delayed_this_week': delayed,
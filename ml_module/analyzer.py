@@ -1,7 +1,6 @@
 # ml_module/analyzer.py
 # Behavior analysis module for medication tracking
 
-from datetime import datetime, timedelta
 import config
 
 class BehaviorAnalyzer:
@@ -12,9 +11,12 @@ class BehaviorAnalyzer:
     
     def analyze_adherence_rate(self, days=30):
         """Calculate adherence rate for last N days"""
-        history = self.db.get_dose_history(days=days)
-        
-        if not history:
+        counts = self.db.get_adherence_counts(days=days)
+        return self._adherence_from_counts(counts)
+    
+    def _adherence_from_counts(self, counts):
+        """Build adherence summary from per-status dose counts"""
+        if not counts:
             return {
                 'adherence_rate': 0,
                 'total_doses': 0,
@@ -23,10 +25,10 @@ class BehaviorAnalyzer:
                 'delayed': 0
             }
         
-        taken = sum(1 for h in history if h['status'] == 'taken')
-        missed = sum(1 for h in history if h['status'] == 'missed')
-        delayed = sum(1 for h in history if h['status'] == 'delayed')
-        total = len(history)
+        taken = counts.get('taken', 0)
+        missed = counts.get('missed', 0)
+        delayed = counts.get('delayed', 0)
+        total = sum(counts.values())
         
         # Adherence rate = (taken + delayed) / total
         adherence_rate = ((taken + delayed) / total * 100) if total > 0 else 0
@@ -41,13 +43,11 @@ class BehaviorAnalyzer:
     
     def detect_patterns(self, medication_id=None):
         """Detect patterns in medication taking behavior"""
-        history = self.db.get_dose_history(days=30)
-        
-        # Filter by medication if specified
-        if medication_id:
-            history = [h for h in history if h['medication_id'] == medication_id]
+        # Weekday/hour bucketing and delay stats are computed by SQLite,
+        # filtered by medication if specified
+        buckets = self.db.get_miss_buckets(days=30, medication_id=medication_id)
         
-        if not history:
+        if not buckets['total']:
             return {'patterns': []}
         
         patterns = []
@@ -56,13 +56,11 @@ class BehaviorAnalyzer:
         weekend_misses = 0
         weekday_misses = 0
         
-        for record in history:
-            if record['status'] == 'missed':
-                dose_date = datetime.strptime(record['scheduled_time'], '%Y-%m-%d %H:%M')
-                if dose_date.weekday() >= 5:  # Saturday=5, Sunday=6
-                    weekend_misses += 1
-                else:
-                    weekday_misses += 1
+        for dow, count in buckets['by_weekday'].items():
+            if dow in (0, 6):  # Sunday=0, Saturday=6
+                weekend_misses += count
+            else:
+                weekday_misses += count
         
         if weekend_misses > weekday_misses * 1.5:
             patterns.append({
@@ -72,9 +70,8 @@ class BehaviorAnalyzer:
             })
         
         # Pattern 2: Consistent delays
-        delays = [h['delay_minutes'] for h in history if h['status'] == 'delayed']
-        if len(delays) > 5:
-            avg_delay = sum(delays) / len(delays)
+        if buckets['delayed_count'] > 5:
+            avg_delay = buckets['avg_delay']
             if avg_delay > 60:
                 patterns.append({
                     'type': 'consistent_delays',
@@ -83,11 +80,7 @@ class BehaviorAnalyzer:
                 })
         
         # Pattern 3: Specific time slot issues
-        time_slot_misses = {}
-        for record in history:
-            if record['status'] == 'missed':
-                time = datetime.strptime(record['scheduled_time'], '%Y-%m-%d %H:%M').hour
-                time_slot_misses[time] = time_slot_misses.get(time, 0) + 1
+        time_slot_misses = buckets['by_hour']
         
         if time_slot_misses:
             worst_time = max(time_slot_misses, key=time_slot_misses.get)
@@ -99,8 +92,14 @@ class BehaviorAnalyzer:
                 })
         
         # Pattern 4: Improving or declining trend
-        recent_adherence = self.analyze_adherence_rate(days=7)['adherence_rate']
-        older_adherence = self.analyze_adherence_rate(days=30)['adherence_rate']
+        # Both windows come from one query; the 30-day rate spans both parts
+        windows = self.db.get_adherence_counts_dual(days_recent=7, days_old=30)
+        month_counts = dict(windows['old'])
+        for status, count in windows['recent'].items():
+            month_counts[status] = month_counts.get(status, 0) + count
+        
+        recent_adherence = self._adherence_from_counts(windows['recent'])['adherence_rate']
+        older_adherence = self._adherence_from_counts(month_counts)['adherence_rate']
         
         if recent_adherence > older_adherence + 10:
             patterns.append({
@@ -119,8 +118,8 @@ class BehaviorAnalyzer:
     
     def get_risk_factors(self, medication_id):
         """Identify risk factors for missing next dose"""
-        history = self.db.get_dose_history(days=14)
-        history = [h for h in history if h['medication_id'] == medication_id]
+        # Only the latest week of doses is scored
+        history = self.db.get_recent_dose_status(medication_id, limit=7, days=14)
         
         if len(history) < 5:
             return {
@@ -130,14 +129,20 @@ class BehaviorAnalyzer:
         
         factors = []
         
+        recent_misses = 0
+        recent_delays = 0
+        for status, delay_minutes in history:
+            if status == 'missed':
+                recent_misses += 1
+            elif status == 'delayed':
+                recent_delays += 1
+        
         # Recent misses
-        recent_misses = sum(1 for h in history[:7] if h['status'] == 'missed')
         if recent_misses >= 2:
             factors.append(f'Missed {recent_misses} doses in last week')
         
         # Delay trend
-        recent_delays = [h['delay_minutes'] for h in history[:7] if h['status'] == 'delayed']
-        if len(recent_delays) >= 3:
+        if recent_delays >= 3:
             factors.append('Frequent delays recently')
         
         # Calculate risk level
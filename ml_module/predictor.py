@@ -2,13 +2,118 @@
 # Machine Learning predictor for missed dose probability
 
 from datetime import datetime, timedelta
+import hashlib
 import pickle
 import os
+import struct
+import tempfile
+import threading
+import zipfile
+import joblib
+
+# Use Intel's accelerated scikit-learn kernels when the extension is
+# installed; the patch must run before sklearn estimators are imported
+try:
+    from sklearnex import patch_sklearn
+    patch_sklearn()
+except ImportError:
+    pass
+
 from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import StandardScaler
 import numpy as np
 import config
 
+# Compile the training-set kernel when numba is installed
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Status codes stored in the history columns
+STATUS_TAKEN = 0
+STATUS_DELAYED = 1
+STATUS_MISSED = 2
+STATUS_OTHER = 3
+STATUS_CODES = {'taken': STATUS_TAKEN, 'delayed': STATUS_DELAYED, 'missed': STATUS_MISSED}
+
+def _write_atomically(path, write):
+    """
+    Call write(file) on a temp file of our own next to path, then swap it
+    in, so readers never see a partial file and concurrent threads or
+    worker processes never write to the same temp path
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    tmp = tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False)
+    try:
+        with tmp:
+            write(tmp)
+        os.replace(tmp.name, path)
+    except BaseException:
+        os.remove(tmp.name)
+        raise
+
+def _sigmoid(z):
+    """Element-wise logistic function that never overflows np.exp"""
+    return np.exp(-np.logaddexp(0.0, -z))
+
+def _training_rows(times, hours, days_of_week, status_code, delay, X, y):
+    """
+    Fill X and y with one sample per record from the records before it
+    Inputs are oldest first; the 7-day window is the index range
+    [left, i), so every sample costs O(1). Returns the number of rows
+    """
+    n = len(times)
+    rows = 0
+    left = 0
+    window_misses = 0
+    delay_sum = 0.0
+    delay_count = 0
+    streak = 0
+    week = 7 * 1440
+    
+    for i in range(n):
+        if i > 0:
+            # The previous record joins this sample's past
+            code = status_code[i-1]
+            if code == STATUS_MISSED:
+                window_misses += 1
+            elif code == STATUS_DELAYED:
+                delay_sum += delay[i-1]
+                delay_count += 1
+            streak = streak + 1 if code <= STATUS_DELAYED else 0
+        
+        # Drop past records older than 7 days before this dose
+        cutoff = times[i] - week
+        while left < i and times[left] <= cutoff:
+            code = status_code[left]
+            if code == STATUS_MISSED:
+                window_misses -= 1
+            elif code == STATUS_DELAYED:
+                delay_sum -= delay[left]
+                delay_count -= 1
+            left += 1
+        
+        if i >= 3:  # Need some history
+            window_size = i - left
+            X[rows, 0] = hours[i]
+            X[rows, 1] = days_of_week[i]
+            X[rows, 2] = window_misses / window_size if window_size else 0.0
+            X[rows, 3] = delay_sum / delay_count if delay_count else 0.0
+            X[rows, 4] = streak
+            
+            # Label: 1 if missed, 0 otherwise
+            y[rows] = 1 if status_code[i] == STATUS_MISSED else 0
+            rows += 1
+    
+    return rows
+
+if njit is not None:
+    _training_rows_kernel = njit(cache=True)(_training_rows)
+else:
+    _training_rows_kernel = None
+
 class MissedDosePredictor:
     """Predicts probability of missing next dose using ML"""
     
@@ -16,39 +121,214 @@ class MissedDosePredictor:
         self.db = db_manager
         self.model = None
         self.scaler = StandardScaler()
+        
+        # Plain copies of the fitted parameters used for fast inference,
+        # see _inference_params. Replaced as a whole under _cache_lock, so
+        # readers take one reference and never mix two models' values
+        self._params = None
+        
+        # Requests run on several threads; only one of them may train
+        self._train_lock = threading.RLock()
+        
+        # Predictions for today's doses keyed by (medication_id,
+        # scheduled_time, history fingerprint), persisted so page refreshes
+        # skip recomputation; every access holds _cache_lock
+        self._pred_cache = {}
+        self._pred_cache_dirty = False
+        self._cache_lock = threading.RLock()
+        
         self.load_model()
+        self._load_prediction_cache()
     
     def load_model(self):
         """Load trained model if exists"""
+        # Predictions only need the fitted parameters, so skip unpickling
+        # the sklearn objects when the parameter file is available
+        if self._load_inference_params():
+            return
+        
         if os.path.exists(config.MODEL_PATH):
             try:
-                with open(config.MODEL_PATH, 'rb') as f:
-                    saved_data = pickle.load(f)
-                    self.model = saved_data['model']
-                    self.scaler = saved_data['scaler']
-            except:
+                # Memory-map the numpy payloads instead of copying them in
+                saved_data = joblib.load(config.MODEL_PATH, mmap_mode='r')
+                self.model = saved_data['model']
+                self.scaler = saved_data['scaler']
+                self._params = self._params_from_model(self.model, self.scaler)
+            except (OSError, EOFError, ValueError, TypeError, KeyError, IndexError,
+                    struct.error, pickle.UnpicklingError) as e:
+                # Only a missing or corrupt file falls back to retraining
+                print(f"Error loading model: {e}")
                 self.model = None
     
+    def _inference_params(self, w, b, mu, sigma):
+        """
+        Bundle the fitted scaler and regression parameters as float32
+        arrays, so a prediction is a dot product instead of a pass
+        through sklearn's input validation
+        Standardization is folded into the weights, since
+        w . (x - mu) / sigma + b == x . (w / sigma) + (b - w . mu / sigma);
+        the fold is computed in float64 and stored as float32
+        """
+        w = np.asarray(w, dtype=np.float32)
+        b = np.float32(b)
+        mu = np.asarray(mu, dtype=np.float32)
+        sigma = np.asarray(sigma, dtype=np.float32)
+        w_scaled = w.astype(np.float64) / sigma
+        w_folded = w_scaled.astype(np.float32)
+        b_folded = np.float32(b - np.dot(w_scaled, mu))
+        
+        return {
+            'w': w,
+            'b': b,
+            'mu': mu,
+            'sigma': sigma,
+            'w_folded': w_folded,
+            'b_folded': b_folded,
+            # Identifies the model in prediction cache keys, the same in
+            # every process that loaded these parameters
+            'version': hashlib.sha1(w_folded.tobytes() + b_folded.tobytes()).hexdigest()
+        }
+    
+    def _params_from_model(self, model, scaler):
+        """Inference parameters of a fitted model and scaler"""
+        return self._inference_params(model.coef_.ravel(), model.intercept_[0],
+                                      scaler.mean_, scaler.scale_)
+    
+    def _load_inference_params(self):
+        """Load the saved inference parameters; returns True on success"""
+        if not os.path.exists(config.INFERENCE_PARAMS_PATH):
+            return False
+        
+        try:
+            with np.load(config.INFERENCE_PARAMS_PATH) as saved:
+                self._params = self._inference_params(saved['w'], saved['b'], saved['mu'], saved['sigma'])
+        except (OSError, EOFError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            # Fall back to the joblib model, or a retrain
+            print(f"Error loading inference parameters: {e}")
+            return False
+        
+        return True
+    
     def save_model(self):
         """Save trained model"""
-        os.makedirs(os.path.dirname(config.MODEL_PATH), exist_ok=True)
-        with open(config.MODEL_PATH, 'wb') as f:
-            pickle.dump({
-                'model': self.model,
-                'scaler': self.scaler
-            }, f)
+        # Uncompressed so load_model can memory-map the arrays
+        saved_data = {'model': self.model, 'scaler': self.scaler}
+        _write_atomically(config.MODEL_PATH, lambda f: joblib.dump(saved_data, f, compress=0))
+        
+        # The 20 floats inference needs, loadable without sklearn objects.
+        # Written last: load_model prefers this file, so a save interrupted
+        # in between leaves the previous model's parameters in use
+        params = self._params
+        _write_atomically(config.INFERENCE_PARAMS_PATH, lambda f: np.savez(
+            f, w=params['w'], b=params['b'], mu=params['mu'], sigma=params['sigma']))
     
-    def extract_features(self, history, target_time):
+    def _load_prediction_cache(self):
+        """Load cached predictions saved by an earlier run"""
+        if os.path.exists(config.PREDICTION_CACHE_PATH):
+            try:
+                with open(config.PREDICTION_CACHE_PATH, 'rb') as f:
+                    self._pred_cache = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                self._pred_cache = {}
+    
+    def _flush_prediction_cache(self):
+        """Save cached predictions, dropping those for past days"""
+        with self._cache_lock:
+            if not self._pred_cache_dirty:
+                return
+            
+            today = datetime.now().strftime('%Y-%m-%d')
+            self._pred_cache = {
+                key: value for key, value in self._pred_cache.items()
+                if key[1].startswith(today)
+            }
+            
+            cache = self._pred_cache
+            _write_atomically(config.PREDICTION_CACHE_PATH, lambda f: pickle.dump(cache, f))
+            self._pred_cache_dirty = False
+    
+    def _clear_prediction_cache(self):
+        """Forget cached predictions, e.g. after the model changes"""
+        with self._cache_lock:
+            self._pred_cache = {}
+            self._pred_cache_dirty = True
+            self._flush_prediction_cache()
+    
+    def _get_cached(self, key):
+        """Return the cached prediction for key, or None"""
+        with self._cache_lock:
+            return self._pred_cache.get(key)
+    
+    def _store_prediction(self, key, prediction, params):
         """
-        Extract features for ML model
-        Features:
-        1. Hour of day
-        2. Day of week (0=Monday, 6=Sunday)
-        3. Recent miss rate (last 7 days)
-        4. Average delay (last 7 days)
-        5. Streak of consecutive takes
+        Cache a prediction for one of today's doses; predictions for
+        other days are returned uncached so arbitrary caller-supplied
+        times cannot grow the cache or force a rewrite of its file
+        params: the inference parameters the prediction was made with
+        """
+        if not key[1].startswith(datetime.now().strftime('%Y-%m-%d')):
+            return
+        
+        with self._cache_lock:
+            # A model trained meanwhile made this prediction stale
+            if self._params is not params:
+                return
+            self._pred_cache[key] = prediction
+            self._pred_cache_dirty = True
+    
+    def _prediction_key(self, medication_id, columns, scheduled_time, params):
+        """
+        Cache key for a dose prediction
+        columns: the medication's history columns, newest first
+        params: the inference parameters predicting it, or None
         """
-        target_dt = datetime.strptime(target_time, '%Y-%m-%d %H:%M')
+        # Records are only ever added, so count plus newest and oldest
+        # times identify the history cheaply
+        times = columns['times']
+        if len(times):
+            fingerprint = (len(times), int(times[0].astype(np.int64)), int(times[-1].astype(np.int64)))
+        else:
+            fingerprint = (0,)
+        
+        # Entries saved by another process for a different model never match
+        model_version = params['version'] if params is not None else None
+        
+        return (medication_id, scheduled_time, fingerprint, model_version)
+    
+    def _cached_prediction(self, medication_id, columns, scheduled_time):
+        """
+        Return the prediction for a dose, computing it only when the
+        medication's history or the model changed since it was last cached
+        """
+        params = self._params
+        key = self._prediction_key(medication_id, columns, scheduled_time, params)
+        prediction = self._get_cached(key)
+        if prediction is None:
+            prediction = self._predict_for_history(columns, scheduled_time, params)
+            self._store_prediction(key, prediction, params)
+        return prediction
+    
+    def _preparse_history(self, history):
+        """
+        Convert history records into column arrays
+        Parses every scheduled_time once and encodes status as uint8
+        STATUS_* codes, so feature extraction is vectorized masks and
+        reductions instead of per-record parsing and string compares
+        history must already be newest first, as get_dose_history returns
+        it; the streak feature and the training walk depend on that order
+        """
+        return {
+            'medication_id': np.array([h['medication_id'] for h in history], dtype=np.int32),
+            'times': np.array([h['scheduled_time'] for h in history], dtype='datetime64[m]'),
+            'status': np.fromiter((STATUS_CODES.get(h['status'], STATUS_OTHER) for h in history),
+                                  dtype=np.uint8, count=len(history)),
+            'delay': np.array([h['delay_minutes'] for h in history], dtype=np.float32)
+        }
+    
+    def _features_from_columns(self, columns, target_dt):
+        """Compute the feature row for target_dt from newest-first columns"""
+        times = columns['times']
+        status = columns['status']
         
         # Feature 1: Hour of day
         hour = target_dt.hour
@@ -57,110 +337,183 @@ class MissedDosePredictor:
         day_of_week = target_dt.weekday()
         
         # Feature 3: Recent miss rate
-        recent_history = [h for h in history if 
-                         datetime.strptime(h['scheduled_time'], '%Y-%m-%d %H:%M') 
-                         > target_dt - timedelta(days=7)]
-        
-        if recent_history:
-            miss_rate = sum(1 for h in recent_history if h['status'] == 'missed') / len(recent_history)
-        else:
-            miss_rate = 0
+        recent = times > np.datetime64(target_dt - timedelta(days=7), 'm')
+        recent_status = status[recent]
+        miss_rate = float((recent_status == STATUS_MISSED).mean()) if recent_status.size else 0
         
         # Feature 4: Average delay
-        delays = [h['delay_minutes'] for h in recent_history if h['status'] == 'delayed']
-        avg_delay = sum(delays) / len(delays) if delays else 0
-        
-        # Feature 5: Current streak
-        streak = 0
-        sorted_history = sorted(history, 
-                               key=lambda x: x['scheduled_time'], 
-                               reverse=True)
+        delays = columns['delay'][recent & (status == STATUS_DELAYED)]
+        avg_delay = float(delays.mean()) if delays.size else 0
         
-        for record in sorted_history:
-            if record['status'] in ['taken', 'delayed']:
-                streak += 1
-            else:
-                break
+        # Feature 5: Current streak (doses before the first miss, newest first)
+        broken = status > STATUS_DELAYED
+        streak = int(np.argmax(broken)) if broken.any() else len(status)
         
         return [hour, day_of_week, miss_rate, avg_delay, streak]
     
-    def train_model(self):
-        """Train the ML model using historical data"""
-        history = self.db.get_dose_history(days=60)
+    def extract_features(self, history, target_time):
+        """
+        Extract features for ML model
+        Features:
+        1. Hour of day
+        2. Day of week (0=Monday, 6=Sunday)
+        3. Recent miss rate (last 7 days)
+        4. Average delay (last 7 days)
+        5. Streak of consecutive takes
+        """
+        # 'YYYY-MM-DD HH:MM' is ISO format, which fromisoformat parses far
+        # faster than strptime
+        target_dt = datetime.fromisoformat(target_time)
+        return self._features_from_columns(self._preparse_history(history), target_dt)
+    
+    def _history_columns(self, days):
+        """Read the last N days of dose history as newest-first columns"""
+        return self._preparse_history(self.db.get_dose_history(days=days))
+    
+    def _select_rows(self, columns, mask):
+        """Keep the rows of every column where mask is set"""
+        return {name: values[mask] for name, values in columns.items()}
+    
+    def _group_by_medication(self, columns):
+        """Split history columns per medication, keeping newest-first order"""
+        # A stable sort by medication keeps each group in its original order
+        order = np.argsort(columns['medication_id'], kind='stable')
+        ordered = {name: values[order] for name, values in columns.items()}
+        medication_ids, starts = np.unique(ordered['medication_id'], return_index=True)
+        ends = np.append(starts[1:], len(order))
         
-        if len(history) < config.TRAINING_DATA_MIN_RECORDS:
-            return False
+        return {
+            int(medication_id): {name: values[start:end] for name, values in ordered.items()}
+            for medication_id, start, end in zip(medication_ids, starts, ends)
+        }
+    
+    def _build_training_set(self, columns):
+        """
+        Build one feature row per record from the records before it
+        Runs the sliding-window kernel compiled by numba when available,
+        otherwise the same loop in Python over plain lists
+        """
+        # Oldest first; times as minutes since the epoch
+        times = columns['times'][::-1].astype(np.int64)
+        hours = (times // 60) % 24
+        days_of_week = (times // 1440 + 3) % 7  # 1970-01-01 was a Thursday
+        status_code = np.ascontiguousarray(columns['status'][::-1])
+        delay = np.ascontiguousarray(columns['delay'][::-1])
         
-        X = []  # Features
-        y = []  # Labels (1=missed, 0=taken/delayed)
+        n = len(times)
+        X = np.empty((n, 5), dtype=np.float32)  # Features
+        y = np.empty(n, dtype=np.int8)  # Labels (1=missed, 0=taken/delayed)
         
-        # Create training data
-        for i, record in enumerate(history):
-            # Use history before this record
-            past_history = history[i+1:]
-            
-            if len(past_history) >= 3:  # Need some history
-                features = self.extract_features(past_history, record['scheduled_time'])
-                X.append(features)
-                
-                # Label: 1 if missed, 0 otherwise
-                label = 1 if record['status'] == 'missed' else 0
-                y.append(label)
+        if _training_rows_kernel is not None:
+            rows = _training_rows_kernel(times, hours, days_of_week, status_code, delay, X, y)
+        else:
+            # List indexing is much faster than numpy scalar access in Python
+            rows = _training_rows(times.tolist(), hours.tolist(), days_of_week.tolist(),
+                                  status_code.tolist(), delay.tolist(), X, y)
         
-        if len(X) < config.TRAINING_DATA_MIN_RECORDS:
-            return False
+        return X[:rows], y[:rows]
+    
+    def train_model(self, columns=None):
+        """
+        Train the ML model using historical data
+        columns: optional 60-day history columns, read when not given
+        """
+        if columns is None:
+            columns = self._history_columns(days=60)
         
-        # Train model
-        X = np.array(X)
-        y = np.array(y)
+        if len(columns['times']) < config.TRAINING_DATA_MIN_RECORDS:
+            return False
         
-        # Scale features
-        X_scaled = self.scaler.fit_transform(X)
+        X, y = self._build_training_set(columns)
         
-        # Train Logistic Regression
-        self.model = LogisticRegression(random_state=42, max_iter=1000)
-        self.model.fit(X_scaled, y)
+        if len(X) < config.TRAINING_DATA_MIN_RECORDS:
+            return False
         
-        # Save model
-        self.save_model()
+        # One thread trains at a time; readers keep using the current
+        # model until the new one is swapped in
+        with self._train_lock:
+            # Scale features
+            scaler = StandardScaler()
+            X_scaled = scaler.fit_transform(X)
+            
+            # Train Logistic Regression
+            model = LogisticRegression(random_state=42, max_iter=1000)
+            model.fit(X_scaled, y)
+            params = self._params_from_model(model, scaler)
+            
+            # Swap in the new model and drop the predictions of the old
+            # one together, under the lock readers cache through
+            with self._cache_lock:
+                self.model = model
+                self.scaler = scaler
+                self._params = params
+                self._clear_prediction_cache()
+            
+            # Save model
+            self.save_model()
         
         return True
     
+    def ensure_model(self, columns_60d=None):
+        """
+        Train the model if none exists yet, so no single prediction pays
+        for training. Call before predict_miss_probability
+        columns_60d: optional 60-day history columns, read when not given
+        Returns True when a model is available
+        """
+        if self._params is None:
+            with self._train_lock:
+                # Another thread may have trained while this one waited
+                if self._params is None:
+                    self.train_model(columns_60d)
+        return self._params is not None
+    
     def predict_miss_probability(self, medication_id, scheduled_time):
         """
         Predict probability of missing a dose
+        Assumes ensure_model() ran first; without a model the result
+        is 'unknown' rather than a prediction
         Returns: probability (0-1)
         """
         # Get history for this medication
-        all_history = self.db.get_dose_history(days=30)
-        history = [h for h in all_history if h['medication_id'] == medication_id]
+        all_columns = self._history_columns(days=30)
+        columns = self._select_rows(all_columns, all_columns['medication_id'] == medication_id)
         
+        prediction = self._cached_prediction(medication_id, columns, scheduled_time)
+        self._flush_prediction_cache()
+        return prediction
+    
+    def _unscorable_prediction(self, columns, params):
+        """Return the 'unknown' result when a dose cannot be scored, else None"""
         # Need minimum data
-        if len(history) < 5:
+        if len(columns['times']) < 5:
             return {
                 'probability': 0.0,
                 'risk_level': 'unknown',
                 'message': 'Not enough data to predict'
             }
         
-        # Train model if not exists
-        if self.model is None:
-            trained = self.train_model()
-            if not trained:
-                return {
-                    'probability': 0.0,
-                    'risk_level': 'unknown',
-                    'message': 'Insufficient data to train model'
-                }
-        
-        # Extract features
-        features = self.extract_features(history, scheduled_time)
-        features_scaled = self.scaler.transform([features])
-        
-        # Predict
-        probability = self.model.predict_proba(features_scaled)[0][1]
+        # Callers train the model beforehand through ensure_model
+        if params is None:
+            return {
+                'probability': 0.0,
+                'risk_level': 'unknown',
+                'message': 'Insufficient data to train model'
+            }
         
-        # Determine risk level
+        return None
+    
+    def _miss_probabilities(self, features, params):
+        """
+        Miss probability for each row of an (N, 5) feature matrix
+        Logistic regression is sigmoid(scaled(X) . w + b); with the
+        scaler folded into the weights the whole batch is one product
+        """
+        z = features @ params['w_folded'] + params['b_folded']
+        return _sigmoid(z.astype(np.float64))
+    
+    def _risk_prediction(self, probability):
+        """Build the prediction result for a miss probability"""
         if probability > config.MISS_PROBABILITY_THRESHOLD:
             risk_level = 'high'
             message = f'High risk of missing dose ({int(probability*100)}% probability)'
@@ -177,16 +530,47 @@ class MissedDosePredictor:
             'message': message
         }
     
+    def _predict_for_history(self, columns, scheduled_time, params):
+        """Predict miss probability from one medication's recent history"""
+        prediction = self._unscorable_prediction(columns, params)
+        if prediction is not None:
+            return prediction
+        
+        target_dt = datetime.fromisoformat(scheduled_time)
+        features = np.array([self._features_from_columns(columns, target_dt)], dtype=np.float32)
+        return self._risk_prediction(float(self._miss_probabilities(features, params)[0]))
+    
     def get_predictions_for_today(self):
         """Get predictions for all today's scheduled doses"""
         schedule = self.db.get_todays_schedule()
+        
+        # One 60-day read serves both training and the 30-day prediction window
+        columns_60d = self._history_columns(days=60)
+        self.ensure_model(columns_60d)
+        params = self._params
+        
+        # The cutoff matches get_dose_history(days=30)
+        start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+        recent = columns_60d['times'] >= np.datetime64(start_date, 'm')
+        history_by_med = self._group_by_medication(self._select_rows(columns_60d, recent))
+        empty = self._select_rows(columns_60d, np.zeros(len(recent), dtype=bool))
+        
         predictions = []
+        pending = []  # (prediction index, cache key, feature row) still to score
         
         for dose in schedule:
-            prediction = self.predict_miss_probability(
-                dose['medication_id'], 
-                dose['scheduled_time']
-            )
+            medication_id = dose['medication_id']
+            columns = history_by_med.get(medication_id, empty)
+            key = self._prediction_key(medication_id, columns, dose['scheduled_time'], params)
+            
+            prediction = self._get_cached(key)
+            if prediction is None:
+                prediction = self._unscorable_prediction(columns, params)
+                if prediction is None:
+                    target_dt = datetime.fromisoformat(dose['scheduled_time'])
+                    pending.append((len(predictions), key, self._features_from_columns(columns, target_dt)))
+                else:
+                    self._store_prediction(key, prediction, params)
             
             predictions.append({
                 'medication_name': dose['name'],
@@ -194,4 +578,16 @@ class MissedDosePredictor:
                 'prediction': prediction
             })
         
+        # Score every uncached dose with one matrix product
+        if pending:
+            features = np.array([row for _, _, row in pending], dtype=np.float32)
+            probabilities = self._miss_probabilities(features, params).tolist()
+            for (index, key, _), probability in zip(pending, probabilities):
+                prediction = self._risk_prediction(probability)
+                self._store_prediction(key, prediction, params)
+                predictions[index]['prediction'] = prediction
+        
+        # Persist once per call rather than once per dose
+        self._flush_prediction_cache()
+        
         return predictions
\ No newline at end of file
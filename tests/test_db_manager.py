@@ -0,0 +1,144 @@
+# tests/test_db_manager.py
+# Checks the startup migration and foreign-key handling of DatabaseManager
+
+import sqlite3
+
+import pytest
+
+import config
+from database.db_manager import DatabaseManager
+
+# Schema and rows as the original initialize_database created them, with
+# foreign keys that do not cascade
+LEGACY_SCHEMA = '''
+    CREATE TABLE medications (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        dosage TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE schedules (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        medication_id INTEGER NOT NULL,
+        scheduled_time TEXT NOT NULL,
+        FOREIGN KEY (medication_id) REFERENCES medications (id)
+    );
+    CREATE TABLE dose_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        medication_id INTEGER NOT NULL,
+        scheduled_time TIMESTAMP NOT NULL,
+        actual_time TIMESTAMP,
+        status TEXT NOT NULL,
+        delay_minutes INTEGER DEFAULT 0,
+        recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (medication_id) REFERENCES medications (id)
+    );
+'''
+
+MEDICATIONS = [
+    (1, 'Aspirin', '500mg', '2024-01-01 08:00:00'),
+    (3, 'Vitamin D', '1000IU', '2024-01-02 09:00:00'),
+]
+SCHEDULES = [
+    (1, 1, '08:00'),
+    (2, 1, '20:00'),
+    (5, 3, '13:00'),
+]
+DOSE_HISTORY = [
+    (1, 1, '2024-01-03 08:00', '2024-01-03 08:05', 'taken', 5, '2024-01-03 08:05:00'),
+    (2, 1, '2024-01-03 20:00', None, 'missed', 0, '2024-01-03 23:00:00'),
+    (4, 3, '2024-01-03 13:00', '2024-01-03 15:00', 'delayed', 120, '2024-01-03 15:00:00'),
+]
+# Left behind by a medication deleted before foreign keys were enforced
+ORPHAN_DOSE = (7, 2, '2024-01-02 08:00', None, 'missed', 0, '2024-01-02 09:00:00')
+
+INDEXES = {'idx_schedules_med', 'idx_dh_sched', 'idx_dh_med_sched', 'idx_dh_sched_status'}
+
+
+@pytest.fixture
+def legacy_db(tmp_path, monkeypatch):
+    """Path of a database in the original schema, used by DatabaseManager"""
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.executemany('INSERT INTO medications VALUES (?, ?, ?, ?)', MEDICATIONS)
+    conn.executemany('INSERT INTO schedules VALUES (?, ?, ?)', SCHEDULES)
+    conn.executemany('INSERT INTO dose_history VALUES (?, ?, ?, ?, ?, ?, ?)', DOSE_HISTORY + [ORPHAN_DOSE])
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(config, 'DATABASE_PATH', path)
+    return path
+
+
+def read_rows(conn, table):
+    return [tuple(row) for row in conn.execute(f'SELECT * FROM {table} ORDER BY id')]
+
+
+def dump_database(conn):
+    """Schema and every row, to compare a database before and after"""
+    schema = [tuple(row) for row in conn.execute('SELECT type, name, sql FROM sqlite_master ORDER BY name')]
+    return schema, [read_rows(conn, table) for table in ('medications', 'schedules', 'dose_history')]
+
+
+def test_migration_keeps_rows_and_cascades(legacy_db):
+    db = DatabaseManager()
+    conn = db.get_connection()
+
+    # Rows and ids survive; only the orphan is dropped
+    assert read_rows(conn, 'medications') == MEDICATIONS
+    assert read_rows(conn, 'schedules') == SCHEDULES
+    assert read_rows(conn, 'dose_history') == DOSE_HISTORY
+
+    indexes = {row['name'] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert INDEXES <= indexes
+    legacy_tables = {row['name'] for row in conn.execute("SELECT name FROM sqlite_master WHERE name LIKE '%_legacy'")}
+    assert not legacy_tables
+
+    for table in ('schedules', 'dose_history'):
+        foreign_keys = conn.execute(f'PRAGMA foreign_key_list({table})').fetchall()
+        assert [(fk['table'], fk['on_delete']) for fk in foreign_keys] == [('medications', 'CASCADE')]
+
+    # AUTOINCREMENT keeps counting past the migrated ids
+    assert db.add_medication('New', '1mg', ['07:00']) == 4
+
+    conn.close()
+
+
+def test_delete_cascades_after_migration(legacy_db):
+    db = DatabaseManager()
+    conn = db.get_connection()
+
+    assert db.delete_medication(1)
+
+    assert conn.execute('SELECT COUNT(*) FROM schedules WHERE medication_id = 1').fetchone()[0] == 0
+    assert conn.execute('SELECT COUNT(*) FROM dose_history WHERE medication_id = 1').fetchone()[0] == 0
+    assert read_rows(conn, 'schedules') == SCHEDULES[2:]
+    assert read_rows(conn, 'dose_history') == DOSE_HISTORY[2:]
+
+    conn.close()
+
+
+def test_second_startup_changes_nothing(legacy_db):
+    first = DatabaseManager()
+    conn = first.get_connection()
+    before = dump_database(conn)
+    conn.close()
+
+    second = DatabaseManager()
+    conn = second.get_connection()
+    assert dump_database(conn) == before
+    conn.close()
+
+
+def test_record_dose_for_missing_medication(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'DATABASE_PATH', str(tmp_path / 'new.db'))
+    db = DatabaseManager()
+    medication_id = db.add_medication('Aspirin', '500mg', ['08:00'])
+
+    assert db.record_dose(medication_id, '2024-01-03 08:00', None, 'missed')
+    assert not db.record_dose(999, '2024-01-03 08:00', None, 'missed')
+
+    conn = db.get_connection()
+    assert conn.execute('SELECT COUNT(*) FROM dose_history').fetchone()[0] == 1
+    conn.close()
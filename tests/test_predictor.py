@@ -0,0 +1,97 @@
+# tests/test_predictor.py
+# Checks the sliding-window training set against the original construction
+
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from ml_module import predictor as predictor_module
+from ml_module.predictor import MissedDosePredictor
+
+TIME_FORMAT = '%Y-%m-%d %H:%M'
+
+
+def make_history(seed, n=150):
+    """Random single-medication history with distinct times, newest first"""
+    rng = random.Random(seed)
+    time = datetime(2024, 1, 1, 7, 0)
+    records = []
+
+    for _ in range(n):
+        # Gaps include exactly 7 days to cover the window boundary
+        time += timedelta(minutes=rng.choice([30, 360, 720, 1440, 2880, 7 * 1440, 7 * 1440 + 60]))
+        status = rng.choice(['taken', 'taken', 'delayed', 'missed', 'skipped'])
+        records.append({
+            'medication_id': 1,
+            'scheduled_time': time.strftime(TIME_FORMAT),
+            'status': status,
+            'delay_minutes': rng.randint(61, 300) if status == 'delayed' else 0
+        })
+
+    return records[::-1]
+
+
+def reference_training_set(history):
+    """The original construction, rescanning every record's past"""
+    X = []
+    y = []
+
+    for i, record in enumerate(history):
+        past = history[i+1:]
+        if len(past) < 3:
+            continue
+
+        target = datetime.strptime(record['scheduled_time'], TIME_FORMAT)
+        recent = [h for h in past
+                  if datetime.strptime(h['scheduled_time'], TIME_FORMAT) > target - timedelta(days=7)]
+        miss_rate = sum(1 for h in recent if h['status'] == 'missed') / len(recent) if recent else 0
+        delays = [h['delay_minutes'] for h in recent if h['status'] == 'delayed']
+        avg_delay = sum(delays) / len(delays) if delays else 0
+
+        streak = 0
+        for h in past:
+            if h['status'] in ['taken', 'delayed']:
+                streak += 1
+            else:
+                break
+
+        X.append([target.hour, target.weekday(), miss_rate, avg_delay, streak])
+        y.append(1 if record['status'] == 'missed' else 0)
+
+    # The original emits rows newest first, the sliding window oldest first
+    return np.array(X[::-1]), np.array(y[::-1])
+
+
+def build_training_set(history):
+    """Run the predictor's builder without a database or model files"""
+    predictor = MissedDosePredictor.__new__(MissedDosePredictor)
+    return predictor._build_training_set(predictor._preparse_history(history))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_training_set_matches_reference(seed):
+    history = make_history(seed)
+    X, y = build_training_set(history)
+    X_ref, y_ref = reference_training_set(history)
+
+    assert X.dtype == np.float32
+    np.testing.assert_allclose(X, X_ref, rtol=1e-5, atol=1e-4)
+    np.testing.assert_array_equal(y, y_ref)
+
+
+@pytest.mark.skipif(predictor_module.njit is None, reason='numba is not installed')
+@pytest.mark.parametrize('seed', range(5))
+def test_compiled_kernel_matches_python_loop(seed, monkeypatch):
+    history = make_history(seed)
+    X_compiled, y_compiled = build_training_set(history)
+
+    # Without the compiled kernel _build_training_set runs the Python loop
+    monkeypatch.setattr(predictor_module, '_training_rows_kernel', None)
+    X_python, y_python = build_training_set(history)
+
+    np.testing.assert_array_equal(X_compiled, X_python)
+    np.testing.assert_array_equal(y_compiled, y_python)
+    assert X_compiled.dtype == X_python.dtype
+    assert y_compiled.dtype == y_python.dtype